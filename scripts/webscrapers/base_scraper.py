@@ -1,26 +1,70 @@
-import glob
-import json
+import asyncio
+import importlib.util
 import logging
 import os
+import shutil
+import tempfile
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from typing import Callable, Iterable
 
-import requests
+import httpx
+import orjson
 from pythonjsonlogger import jsonlogger
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+# Selenium strategies matching the locator names accepted by _get_located_element
+LOCATORS = {
+    "classname": By.CLASS_NAME,
+    "css": By.CSS_SELECTOR,
+    "id": By.ID,
+    "xpath": By.XPATH,
+}
+# Cookie set by the OneTrust banner once the cookies have been accepted or declined
+COOKIE_CONSENT_COOKIE = "OptanonAlertBoxClosed"
+# Seconds between two checks of a wait's condition, Selenium's default is 0.5
+WAIT_POLL_FREQUENCY = 0.05
+# Exceptions meaning that a wait's condition is not met yet
+WAIT_IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+# HTTP/2 needs the h2 package (httpx[http2]), fall back to HTTP/1.1 without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# Maximum number of HTTP requests in flight at the same time
+MAX_CONCURRENT_REQUESTS = 8
+# Size of the chunks in which the downloaded files are written to disk
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+# Chrome flags turning off what a scraping-only browser doesn't need
+CHROME_ARGUMENTS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-notifications",
+    "--disable-background-networking",
+]
+# Subresources blocked through the DevTools protocol, never read by the scrapers
+BLOCKED_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm"]
+# Extension given to the downloads still in progress, same as Chrome's
+PARTIAL_DOWNLOAD_EXTENSION = ".crdownload"
+
 
 class BaseScraper(ABC):
     def __init__(
         self,
         provider_name: str,
+        all_products_page: str,
         base_download_folder_path: str = None,
         is_headless: bool = False,
+        n_workers: int = 1,
     ):
         if not base_download_folder_path:
             base_download_folder_path = (
@@ -32,7 +76,38 @@ class BaseScraper(ABC):
             base_download_folder_path, provider_name
         )
         self.products_json_path = f"{self.download_folder_path}/products.json"
-        self.driver, self.wait = self._configure_driver(is_headless)
+        self.all_products_page = all_products_page
+        self.is_headless = is_headless
+        self.n_workers = n_workers
+
+        # Every thread drives its own browser, downloading in its own folder
+        self._thread_browser = threading.local()
+        self._browsers: list[webdriver.Chrome] = []
+        self._browser_download_folder_paths: list[str] = []
+        self._browsers_lock = threading.Lock()
+        self._worker_pool: ThreadPoolExecutor | None = None
+        self._initialize_thread_browser(is_headless)
+
+    @property
+    def driver(self) -> webdriver.Chrome:
+        """
+        The WebDriver owned by the current thread
+        """
+        return self._thread_browser.driver
+
+    @property
+    def wait(self) -> WebDriverWait:
+        """
+        The WebDriverWait bound to the current thread's WebDriver
+        """
+        return self._thread_browser.wait
+
+    @property
+    def browser_download_folder_path(self) -> str:
+        """
+        The folder where the current thread's browser saves its downloads
+        """
+        return self._thread_browser.download_folder_path
 
     def _initialize_classwide_logger(
         self,
@@ -44,31 +119,116 @@ class BaseScraper(ABC):
         """
         logger = logging.getLogger(self.__class__.__name__)
         logger.setLevel(log_level)
-        handler = logging.StreamHandler()
-        handler.setFormatter(jsonlogger.JsonFormatter(log_format))
-        logger.addHandler(handler)
+        # Loggers are shared by name, attach the handler only the first time
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(jsonlogger.JsonFormatter(log_format))
+            logger.addHandler(handler)
 
         return logger
 
     def _configure_driver(
         self,
         headless: bool = False,
+        download_folder_path: str = None,
     ) -> tuple[webdriver.Chrome, WebDriverWait]:
         """
         Configure the selenium WebDriver
         """
         self.logger.info("Configuring the WebDriver")
         options = webdriver.ChromeOptions()
+        # Hand back control as soon as the DOM is ready, elements are waited for anyway
+        options.page_load_strategy = "eager"
         if headless:
-            options.add_argument("--headless")
-        if self.download_folder_path:
-            prefs = {"download.default_directory": self.download_folder_path}
-            options.add_experimental_option("prefs", prefs)
+            options.add_argument("--headless=new")
+        for argument in CHROME_ARGUMENTS:
+            options.add_argument(argument)
+
+        prefs = {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        }
+        if download_folder_path:
+            prefs["download.default_directory"] = download_folder_path
+        options.add_experimental_option("prefs", prefs)
         driver = webdriver.Chrome(options=options)
-        wait = WebDriverWait(driver, 20)
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+        wait = WebDriverWait(
+            driver,
+            20,
+            poll_frequency=WAIT_POLL_FREQUENCY,
+            ignored_exceptions=WAIT_IGNORED_EXCEPTIONS,
+        )
 
         return driver, wait
 
+    def _initialize_thread_browser(self, headless: bool = False) -> None:
+        """
+        Start a WebDriver for the current thread
+        Each browser gets its own download folder, so that concurrent downloads
+        can't be mistaken for one another
+        """
+        browser_download_folder_path = tempfile.mkdtemp(
+            prefix=f"{self.__class__.__name__}_downloads_"
+        )
+
+        driver, wait = self._configure_driver(headless, browser_download_folder_path)
+        with self._browsers_lock:
+            self._browsers.append(driver)
+            self._browser_download_folder_paths.append(browser_download_folder_path)
+
+        self._thread_browser.driver = driver
+        self._thread_browser.wait = wait
+        self._thread_browser.download_folder_path = browser_download_folder_path
+
+    def _initialize_worker(self) -> None:
+        """
+        Start the worker thread's WebDriver and get it past the initial banners
+        Worker browsers are always headless, only the main one can be watched
+        """
+        self._initialize_thread_browser(headless=True)
+        self.open_web_page(self.all_products_page)
+        self.handle_initial_banners()
+
+    def _map_on_workers(self, func: Callable, *iterables: Iterable) -> list:
+        """
+        Apply func to every item, spreading the calls over n_workers browsers:
+        the current one and n_workers - 1 worker browsers
+        Runs serially on the current browser when a single worker is configured
+        """
+        calls = list(zip(*iterables))
+        if self.n_workers <= 1 or len(calls) <= 1:
+            return [func(*args) for args in calls]
+
+        if self._worker_pool is None:
+            self._worker_pool = ThreadPoolExecutor(
+                max_workers=self.n_workers - 1,
+                thread_name_prefix=self.__class__.__name__,
+                initializer=self._initialize_worker,
+            )
+
+        results = [None] * len(calls)
+        call_indexes = iter(range(len(calls)))
+        call_indexes_lock = threading.Lock()
+
+        def _run_calls() -> None:
+            while True:
+                with call_indexes_lock:
+                    i = next(call_indexes, None)
+                if i is None:
+                    return
+                results[i] = func(*calls[i])
+
+        futures = [
+            self._worker_pool.submit(_run_calls) for _ in range(self.n_workers - 1)
+        ]
+        _run_calls()  # The current browser takes its share of the calls
+        for future in futures:
+            future.result()
+
+        return results
+
     def _generate_download_folder_path(self, base_path: str, provider_name: str) -> str:
         """
         Esures that the download folder path exists or else creates it
@@ -82,83 +242,170 @@ class BaseScraper(ABC):
 
         return dir_name
 
-    def _rename_latest_downloaded_file(self, new_file_name: str) -> bool:
+    def _list_browser_downloads(self) -> set:
         """
-        Renames the most recently modified file in the download folder to new_file_name
+        List the files in the current browser's download folder
         """
-        files = glob.glob(os.path.join(self.download_folder_path, "*"))
+        return set(os.listdir(self.browser_download_folder_path))
 
-        if not files:
-            self.logger.error("No files found in the download folder")
-            return False
+    def _clear_browser_downloads(self, timeout: int = 15) -> set:
+        """
+        Empty the current browser's download folder before a new download
+        Downloads left by earlier timeouts are given time to complete, then removed,
+        so that they can't be mistaken for the new one
+        Returns the files left in the folder, i.e. Chrome's temporary files
+        """
+        try:
+            WebDriverWait(
+                self.driver, timeout, poll_frequency=WAIT_POLL_FREQUENCY
+            ).until(
+                lambda _: not any(
+                    file.endswith(PARTIAL_DOWNLOAD_EXTENSION)
+                    for file in self._list_browser_downloads()
+                )
+            )
+        except TimeoutException:
+            self.logger.error(
+                "Previous downloads not completed within %s seconds", timeout
+            )
+
+        for file in self._list_browser_downloads():
+            if file.startswith("."):  # Chrome's temporary files
+                continue
+            self.logger.warning("Removing leftover download: %s", file)
+            os.remove(os.path.join(self.browser_download_folder_path, file))
+
+        return self._list_browser_downloads()
+
+    def _get_new_download(self, files_before: set) -> str | None:
+        """
+        Get the download completed since files_before was listed, if any
+        """
+        new_files = {
+            file
+            for file in self._list_browser_downloads() - files_before
+            if not file.startswith(".")  # Chrome's temporary files
+        }
+        if not new_files or any(
+            file.endswith(PARTIAL_DOWNLOAD_EXTENSION) for file in new_files
+        ):
+            return None
+
+        if len(new_files) > 1:
+            self.logger.error("More than one new download: %s", sorted(new_files))
+            raise RuntimeError(f"More than one new download: {sorted(new_files)}")
+
+        return new_files.pop()
 
-        # Find latest and new files
-        latest_file = max(files, key=os.path.getmtime)
-        file_extension = latest_file.split(".")[-1]
+    def _wait_for_download(self, files_before: set, timeout: int = 15) -> str | None:
+        """
+        Wait for the current browser to complete a new download
+        Returns the downloaded file's name, or None if it didn't complete in time
+        """
+        try:
+            return WebDriverWait(
+                self.driver, timeout, poll_frequency=WAIT_POLL_FREQUENCY
+            ).until(lambda _: self._get_new_download(files_before))
+        except TimeoutException:
+            self.logger.error("Download not completed within %s seconds", timeout)
+            return None
+
+    def _rename_downloaded_file(self, downloaded_file: str, new_file_name: str) -> bool:
+        """
+        Moves a file from the current browser's download folder into the
+        download folder, renamed to new_file_name
+        """
+        file_path = os.path.join(self.browser_download_folder_path, downloaded_file)
+        file_extension = downloaded_file.split(".")[-1]
         new_file_name = ".".join([new_file_name, file_extension])
 
         # Create the full path for the new file
         new_file_path = os.path.join(self.download_folder_path, new_file_name)
 
         try:
-            self.logger.info(f"Renaming file {latest_file} to: {new_file_path}")
-            os.rename(latest_file, new_file_path)
+            self.logger.info("Renaming file %s to: %s", file_path, new_file_path)
+            shutil.move(file_path, new_file_path)
             return True
         except Exception as e:
-            self.logger.error(f"Error renaming file {latest_file}: {e}")
+            self.logger.error("Error renaming file %s: %s", file_path, e)
             return False
 
     def quit(self) -> None:
         """
-        Close the WebDriver
+        Close the worker pool and all the WebDrivers, removing their download folders
         """
+        if self._worker_pool is not None:
+            self._worker_pool.shutdown()
+            self._worker_pool = None
+
         self.logger.info("Closing the WebDriver")
-        self.driver.quit()
+        with self._browsers_lock:
+            for driver in self._browsers:
+                driver.quit()
+            self._browsers.clear()
+
+            for browser_download_folder_path in self._browser_download_folder_paths:
+                shutil.rmtree(browser_download_folder_path, ignore_errors=True)
+            self._browser_download_folder_paths.clear()
 
     def open_web_page(self, url: str) -> None:
         """
         Open a web page by its URL
+        Nothing is done if the page is already open
         """
-        self.logger.info(f"Opening web page: {url}")
+        if self.driver.current_url == url:
+            self.logger.info("Web page already open: %s", url)
+            return
+
+        self.logger.info("Opening web page: %s", url)
         self.driver.get(url)
 
+    def _decline_cookies(self) -> None:
+        """
+        Decline the cookies from the OneTrust banner
+        The banner is skipped if the cookies were already handled in this session
+        """
+        if self.driver.get_cookie(COOKIE_CONSENT_COOKIE):
+            self.logger.info("Cookies already handled, skipping the cookie banner")
+            return
+
+        decline_cookies_xpath = '//*[@id="onetrust-reject-all-handler"]'
+        self._click_button_by_xpath(xpath=decline_cookies_xpath, btn_name="cookie")
+
     def _click_button_by_xpath(self, xpath: str, btn_name: str = None) -> None:
         """
         Click a button given its xpath
         """
-        self.logger.info(f"Clicking the {btn_name} button")
+        self.logger.info("Clicking the %s button", btn_name)
         try:
             button = self.wait.until(EC.element_to_be_clickable((By.XPATH, xpath)))
             button.click()
         except NoSuchElementException as e:
-            self.logger.error(f"No {btn_name} button found: {e}")
+            self.logger.error("No %s button found: %s", btn_name, e)
 
     def _get_located_element(
         self, element_id: str, locator: str = "xpath"
     ) -> WebElement:
         """
         Get an element by its id
+        The locator can be one of: classname, css, id, xpath
         """
-        try:
-            match locator:
-                case "classname":
-                    locator = By.CLASS_NAME
-                case "xpath":
-                    locator = By.XPATH
-                case _:
-                    self.logger.error(f"Locator not implemented: {locator}")
-                    raise ValueError("Locator not implemented")
+        by = LOCATORS.get(locator)
+        if by is None:
+            self.logger.error("Locator not implemented: %s", locator)
+            raise ValueError("Locator not implemented")
 
+        try:
             web_element = self.wait.until(
                 EC.presence_of_element_located(
                     (
-                        locator,
+                        by,
                         element_id,
                     )
                 )
             )
         except NoSuchElementException as e:
-            self.logger.error(f"Element not found: {e}")
+            self.logger.error("Element not found: %s", e)
 
         return web_element
 
@@ -166,29 +413,124 @@ class BaseScraper(ABC):
         """
         Write the products dictionary into a JSON file
         """
-        with open(self.products_json_path, "w") as json_file:
-            json.dump(products, json_file, indent=4)
+        with open(self.products_json_path, "wb") as json_file:
+            json_file.write(orjson.dumps(products, option=orjson.OPT_INDENT_2))
 
     def _read_products_json(self) -> dict:
         """
         Read the previously saved JSON file
         """
-        with open(self.products_json_path, "r") as file:
-            data = json.load(file)
+        with open(self.products_json_path, "rb") as file:
+            data = orjson.loads(file.read())
             return data
 
-    def _download_file_with_request(self, url: str, file_name: str) -> None:
+    def _build_http_client(self) -> httpx.AsyncClient:
+        """
+        Build the HTTP client shared by all the requests of a batch
+        Connections are kept alive, and multiplexed over HTTP/2 when h2 is installed
+        """
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+            http2=HTTP2_AVAILABLE,
+            timeout=30,
+            follow_redirects=True,
+        )
+
+    async def _download_file_with_request(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        url: str,
+        file_name: str,
+    ) -> None:
+        """
+        Download a file from a URL over HTTP
+        """
+        file_path = os.path.join(self.download_folder_path, file_name)
+        # Stream into a partial file, so that failed downloads leave no truncated file
+        partial_file_path = file_path + PARTIAL_DOWNLOAD_EXTENSION
+
+        async with semaphore:
+            self.logger.info("Downloading file from %s", url)
+            try:
+                async with client.stream("GET", url) as response:
+                    if response.status_code != 200:
+                        self.logger.error(
+                            "Failed to download file: %s", response.status_code
+                        )
+                        return
+
+                    # Compressed responses are decoded while streaming
+                    with open(partial_file_path, "wb") as file:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            file.write(chunk)
+            except httpx.HTTPError as e:
+                self.logger.error("Failed to download file from %s: %s", url, e)
+                if os.path.exists(partial_file_path):
+                    os.remove(partial_file_path)
+                return
+
+        os.replace(partial_file_path, file_path)
+
+    async def _download_files_with_request_async(self, files: dict) -> None:
+        """
+        Concurrently download the files, at most MAX_CONCURRENT_REQUESTS at a time
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        async with self._build_http_client() as client:
+            await asyncio.gather(
+                *(
+                    self._download_file_with_request(client, semaphore, url, file_name)
+                    for file_name, url in files.items()
+                )
+            )
+
+    async def _fetch_web_page_with_request(
+        self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str
+    ) -> str | None:
+        """
+        Fetch a web page's HTML from a URL over HTTP
+        """
+        async with semaphore:
+            self.logger.info("Fetching web page: %s", url)
+            try:
+                response = await client.get(url)
+            except httpx.HTTPError as e:
+                self.logger.error("Failed to fetch web page %s: %s", url, e)
+                return None
+
+        if response.status_code != 200:
+            self.logger.error("Failed to fetch web page: %s", response.status_code)
+            return None
+
+        return response.text
+
+    async def _fetch_web_pages_with_request_async(self, urls: list) -> list:
+        """
+        Concurrently fetch the web pages, at most MAX_CONCURRENT_REQUESTS at a time
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        async with self._build_http_client() as client:
+            return await asyncio.gather(
+                *(
+                    self._fetch_web_page_with_request(client, semaphore, url)
+                    for url in urls
+                )
+            )
+
+    def _fetch_web_pages_with_request(self, urls: list) -> list:
+        """
+        Fetch the web pages' HTML over HTTP, in the same order as urls
+        Pages that couldn't be fetched are returned as None
+        """
+        return asyncio.run(self._fetch_web_pages_with_request_async(urls))
+
+    def _download_files_with_request(self, files: dict) -> None:
         """
-        Download a file from a URL using requests
+        Download the files over HTTP
+        The files dictionary maps each file name to the URL to download it from
         """
-        self.logger.info(f"Downloading file from {url}")
-        response = requests.get(url)
-        if response.status_code == 200:
-            file_path = os.path.join(self.download_folder_path, file_name)
-            with open(file_path, "wb") as file:
-                file.write(response.content)
-        else:
-            self.logger.error(f"Failed to download file: {response.status_code}")
+        asyncio.run(self._download_files_with_request_async(files))
 
     @abstractmethod
     def handle_initial_banners(self) -> None:
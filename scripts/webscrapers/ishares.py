@@ -1,8 +1,8 @@
-from time import sleep
-from urllib.parse import parse_qs, urlparse
+import threading
+from urllib.parse import parse_qs, urljoin, urlparse
 
 from base_scraper import BaseScraper
-from selenium.webdriver.common.by import By
+from bs4 import BeautifulSoup
 from selenium.webdriver.remote.webelement import WebElement
 
 # Set the URL of the website
@@ -10,10 +10,68 @@ ALL_PRODUCTS_PAGE = (
     "https://www.ishares.com/it/investitore-privato/it/prodotti/etf-investments"
 )
 
+# Walk the products table in-page and return only the ETF rows
+EXTRACT_ROWS_SCRIPT = """
+const tbody = arguments[0];
+return [...tbody.querySelectorAll("tr")]
+    .map((row) => {
+        const cells = row.querySelectorAll("td");
+        const th = row.querySelector("th");
+        return {
+            fund_type: cells[0]?.innerText,
+            name: th?.innerText,
+            product_page: th?.querySelector("a")?.href,
+            currency: cells[1]?.innerText,
+            hedged: cells[2]?.innerText,
+            acc_distr: cells[3]?.innerText,
+            ter: cells[4]?.innerText,
+            date: cells[6]?.innerText,
+        };
+    })
+    .filter((row) => row.fund_type === "ETF");
+"""
+
+# CSS selectors of the product's page fields, read as text
+PRODUCT_TEXT_SELECTORS = {
+    "isin": "div.product-data-item.col-isin div.data",
+    "ticker": "div.product-data-item.col-bbeqtick div.data",
+    "price": "#fundheaderTabs > div > div > div > ul > li:nth-of-type(1) > span:nth-of-type(2)",
+}
+# CSS selectors of the product's page fields, read as link
+PRODUCT_LINK_SELECTORS = {
+    "factsheet": "#fundHeaderDocLinks > li:nth-of-type(2) > a",
+    "kid": "#fundHeaderDocLinks > li:nth-of-type(1) > a",
+    "holdings_file": "#holdings > div:nth-of-type(2) > a",
+}
+
+# Read all the product's page fields in-page, null until every element is rendered
+READ_PRODUCT_INFOS_SCRIPT = """
+const [textSelectors, linkSelectors] = arguments;
+const infos = {};
+for (const [field, selector] of Object.entries(textSelectors)) {
+    const element = document.querySelector(selector);
+    if (!element) return null;
+    infos[field] = element.innerText;
+}
+for (const [field, selector] of Object.entries(linkSelectors)) {
+    const element = document.querySelector(selector);
+    if (!element) return null;
+    infos[field] = element.href || null;
+}
+return infos;
+"""
+
 
 class ISharesScraper(BaseScraper):
-    def __init__(self) -> None:
-        super().__init__(provider_name="ishares")
+    def __init__(self, n_workers: int = 6) -> None:
+        super().__init__(
+            provider_name="ishares",
+            all_products_page=ALL_PRODUCTS_PAGE,
+            n_workers=n_workers,
+        )
+        # Product page -> its additional infos, share classes may share a page
+        self._products_infos_cache: dict = {}
+        self._products_infos_cache_lock = threading.Lock()
 
     def handle_initial_banners(self) -> None:
         """
@@ -22,8 +80,7 @@ class ISharesScraper(BaseScraper):
             - Cookies banner
             - Private investors banner
         """
-        decline_cookies_xpath = '//*[@id="onetrust-reject-all-handler"]'
-        self._click_button_by_xpath(xpath=decline_cookies_xpath, btn_name="cookie")
+        self._decline_cookies()
 
         confirm_private_xpath = """//*[@id="direct-url-screen-{lang}"]/div/div[2]/div"""
         self._click_button_by_xpath(
@@ -46,50 +103,27 @@ class ISharesScraper(BaseScraper):
         """
         self.logger.info("Cycling through products table")
         tbody_element = self._get_located_element(
-            '//*[@id="screener-funds"]/screener-table/table/tbody'
+            "#screener-funds > screener-table > table > tbody", locator="css"
         )
 
         def _cycle_trough_tbody(tbody_element: WebElement) -> dict:
             results = {}
-            trows = tbody_element.find_elements(By.TAG_NAME, "tr")
-
-            i = 0
-            for row in trows:
-                # Check that fund type is ETF
-                if row.find_element(By.XPATH, ".//td[1]").text != "ETF":
-                    continue
-
-                # Product name and page
-                th = row.find_element(By.XPATH, ".//th")
-                a_element = th.find_element(By.TAG_NAME, "a")
-                name = th.text
-                product_page = a_element.get_attribute("href")
-
-                # Currency
-                currency = row.find_element(By.XPATH, ".//td[2]").text
-                # Currency hedging
-                hedged = row.find_element(By.XPATH, ".//td[3]").text
-                # ACC - DISTR
-                acc_distr = row.find_element(By.XPATH, ".//td[4]").text
-                # TER
-                ter = row.find_element(By.XPATH, ".//td[5]").text
-                # Date
-                date = row.find_element(By.XPATH, ".//td[7]").text
+            # Extract all the rows in a single round-trip to the browser
+            trows = self.driver.execute_script(EXTRACT_ROWS_SCRIPT, tbody_element)
 
+            for i, row in enumerate(trows):
                 results[f"dummy_key_{i}"] = {  # ISIN not directly available
-                    "name": name,
-                    "currency": currency,
-                    "hedged": hedged,
-                    "acc_distr": acc_distr,
-                    "ter": ter,
-                    "date": date,
-                    "product_page": product_page,
+                    "name": row["name"],
+                    "currency": row["currency"],
+                    "hedged": row["hedged"],
+                    "acc_distr": row["acc_distr"],
+                    "ter": row["ter"],
+                    "date": row["date"],
+                    "product_page": row["product_page"],
                 }
-                i += 1
 
             return results
 
-        products_dict = {}
         products_dict = _cycle_trough_tbody(tbody_element)
 
         return products_dict
@@ -99,42 +133,92 @@ class ISharesScraper(BaseScraper):
         Scrape the product's page to get: ISIN, Ticker, Factsheet, KID, Price
         Also, save the link to the holdings file
         """
+        with self._products_infos_cache_lock:
+            if product_page in self._products_infos_cache:
+                return self._products_infos_cache[product_page]
+
         self.open_web_page(product_page)
-        sleep(1)
-
-        # ISIN
-        isin = self._get_located_element(
-            """//div[contains(@class, 'product-data-item') and contains(@class, 'col-isin')]//div[@class='data']"""
-        ).text
-        # Price
-        price = self._get_located_element(
-            '//*[@id="fundheaderTabs"]/div/div/div/ul/li[1]/span[2]'
-        ).text
-        # Ticker
-        ticker = self._get_located_element(
-            """//div[contains(@class, 'product-data-item') and contains(@class, 'col-bbeqtick')]//div[@class='data']"""
-        ).text
-        # Factsheet
-        factsheet = self._get_located_element(
-            '//*[@id="fundHeaderDocLinks"]/li[2]/a'
-        ).get_attribute("href")
-        # KID
-        kid = self._get_located_element(
-            '//*[@id="fundHeaderDocLinks"]/li[1]/a'
-        ).get_attribute("href")
-        # Holdings file
-        holdings_file = self._get_located_element(
-            '//*[@id="holdings"]/div[2]/a'
-        ).get_attribute("href")
 
-        return {
-            "isin": isin,
-            "ticker": ticker,
-            "price": price,
-            "factsheet": factsheet,
-            "kid": kid,
-            "holdings_file": holdings_file,
-        }
+        # A single round-trip per poll, instead of one wait per field
+        infos = self.wait.until(
+            lambda driver: driver.execute_script(
+                READ_PRODUCT_INFOS_SCRIPT,
+                PRODUCT_TEXT_SELECTORS,
+                PRODUCT_LINK_SELECTORS,
+            )
+        )
+        for field in PRODUCT_TEXT_SELECTORS:
+            infos[field] = self._normalize_text(infos[field])
+        with self._products_infos_cache_lock:
+            self._products_infos_cache[product_page] = infos
+
+        return infos
+
+    def _normalize_text(self, text: str) -> str:
+        """
+        Collapse the whitespace of a field's text, whether read in the browser or from the HTML
+        """
+        return " ".join(text.split())
+
+    def _parse_single_product_infos(self, product_page: str, html: str) -> dict | None:
+        """
+        Parse the product's page HTML to get the same fields as _scrape_single_product_infos
+        Returns None if any of the fields is not in the HTML
+        """
+        soup = BeautifulSoup(html, "html.parser")
+
+        infos = {}
+        for field, selector in PRODUCT_TEXT_SELECTORS.items():
+            element = soup.select_one(selector)
+            if element is None:
+                return None
+            infos[field] = self._normalize_text(element.get_text())
+        for field, selector in PRODUCT_LINK_SELECTORS.items():
+            element = soup.select_one(selector)
+            if element is None or not element.get("href"):
+                return None
+            infos[field] = urljoin(product_page, element["href"])
+
+        return infos
+
+    def _get_products_infos(self, product_pages: list) -> list:
+        """
+        Get the additional infos of every product page
+        Each page is only processed once: the pages are fetched over HTTP,
+        the browser is used only for the pages whose HTML doesn't contain all the fields
+        """
+        with self._products_infos_cache_lock:
+            # Unique pages not processed yet, in order
+            new_pages = [
+                product_page
+                for product_page in dict.fromkeys(product_pages)
+                if product_page not in self._products_infos_cache
+            ]
+
+        pages_html = self._fetch_web_pages_with_request(new_pages)
+        for product_page, html in zip(new_pages, pages_html):
+            infos = (
+                self._parse_single_product_infos(product_page, html) if html else None
+            )
+            if infos is not None:
+                with self._products_infos_cache_lock:
+                    self._products_infos_cache[product_page] = infos
+
+        with self._products_infos_cache_lock:
+            missing_pages = [
+                product_page
+                for product_page in new_pages
+                if product_page not in self._products_infos_cache
+            ]
+        if missing_pages:
+            self.logger.info(
+                "Scraping %s product pages with the browser", len(missing_pages)
+            )
+            self._map_on_workers(self._scrape_single_product_infos, missing_pages)
+
+        return [
+            self._products_infos_cache[product_page] for product_page in product_pages
+        ]
 
     def _get_final_products_json(self, intermediate_json: dict) -> dict:
         """
@@ -142,20 +226,21 @@ class ISharesScraper(BaseScraper):
         possible to gather before this step
         """
         final_json = {}
-        for dummy_key in intermediate_json.keys():
-            additional_infos = self._scrape_single_product_infos(
-                intermediate_json[dummy_key]["product_page"]
-            )
+        products = list(intermediate_json.values())
+        products_infos = self._get_products_infos(
+            [product["product_page"] for product in products]
+        )
+        for product, additional_infos in zip(products, products_infos):
             final_json[additional_infos["isin"]] = {
-                "name": intermediate_json[dummy_key]["name"].split("\n")[0],
+                "name": product["name"].split("\n")[0],
                 "fund_type": None,  # TODO: find a way to distinguish between equity bond or multi
-                "currency": intermediate_json[dummy_key]["currency"],
-                "ter": intermediate_json[dummy_key]["ter"],
+                "currency": product["currency"],
+                "ter": product["ter"],
                 "price": additional_infos["price"],
-                "date": intermediate_json[dummy_key]["date"],
+                "date": product["date"],
                 "factsheet": additional_infos["factsheet"],
                 "kid": additional_infos["kid"],
-                "product_page": intermediate_json[dummy_key]["product_page"],
+                "product_page": product["product_page"],
                 "holdings_file": additional_infos["holdings_file"],
             }
 
@@ -176,15 +261,14 @@ class ISharesScraper(BaseScraper):
         """
         Download the product files from the website
         """
+        files = {}
         for isin, product in products_dict.items():
             url = product["holdings_file"]
             parsed_url = urlparse(url)
             file_extension = parse_qs(parsed_url.query).get("fileType", ["csv"])[0]
+            files[f"{isin}.{file_extension}"] = url
 
-            self._download_file_with_request(
-                url=product["holdings_file"], file_name=f"{isin}.{file_extension}"
-            )
-            sleep(0.5)
+        self._download_files_with_request(files)
 
 
 def main():
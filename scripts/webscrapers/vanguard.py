@@ -1,16 +1,45 @@
-from time import sleep
-
 from base_scraper import BaseScraper
-from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
 # Set the URL of the website
 ALL_PRODUCTS_PAGE = "https://www.it.vanguard/professional/prodotti?tipo-di-prodotto=etf"
 
+# CSS selectors of the holdings download button, by asset class
+HOLDINGS_BUTTON_SELECTORS = {
+    "equity": "europe-core-jump-links-list > div:nth-of-type(17) europe-core-fund-holdings europe-core-download-button > button",
+    "bond": "europe-core-jump-links-list > div:nth-of-type(18) europe-core-fund-holdings europe-core-download-button > button",
+    "multi_asset": "europe-core-jump-links-list > div:nth-of-type(11) europe-core-basket-details europe-core-download-button > button",
+}
+
+# Walk a products table body in-page and return all of its rows
+EXTRACT_ROWS_SCRIPT = """
+const tbody = arguments[0];
+return [...tbody.querySelectorAll("tr")].map((row) => {
+    const cells = row.querySelectorAll("td");
+    const th = row.querySelector("th");
+    return {
+        name: th?.innerText,
+        product_page: th?.querySelector("a")?.href,
+        currency: cells[0]?.innerText,
+        ter: cells[1]?.innerText,
+        price: cells[2]?.innerText,
+        date: cells[3]?.innerText,
+        isin: cells[4]?.innerText,
+        ticker: cells[5]?.innerText,
+        factsheet: cells[6]?.querySelector("span > a")?.href,
+        kid: cells[7]?.querySelector("span > a")?.href,
+    };
+});
+"""
+
 
 class VanguardScraper(BaseScraper):
-    def __init__(self) -> None:
-        super().__init__(provider_name="vanguard")
+    def __init__(self, n_workers: int = 6) -> None:
+        super().__init__(
+            provider_name="vanguard",
+            all_products_page=ALL_PRODUCTS_PAGE,
+            n_workers=n_workers,
+        )
 
     def handle_initial_banners(self) -> None:
         """
@@ -19,12 +48,9 @@ class VanguardScraper(BaseScraper):
             - Cookies banner
             - Professional investors banner
         """
-        decline_cookies_xpath = '//*[@id="onetrust-reject-all-handler"]'
-        self._click_button_by_xpath(xpath=decline_cookies_xpath, btn_name="cookie")
+        self._decline_cookies()
 
-        confirm_professional_xpath = """//*[@id="mat-dialog-0"]/
-        europe-core-cookie-consent-dialog/mat-dialog-content/
-        europe-core-consent-box/div/div[2]/div[2]/button[1]"""
+        confirm_professional_xpath = '//*[@id="mat-dialog-0"]//europe-core-consent-box/div/div[2]/div[2]/button[1]'
         self._click_button_by_xpath(
             xpath=confirm_professional_xpath, btn_name="professional investor"
         )
@@ -35,70 +61,44 @@ class VanguardScraper(BaseScraper):
         The JSON' structure can be seen in the file "./output_examples/vanguard.json"
         """
         self.logger.info("Cycling through products table")
-        table_xpath = """//*[@id="back-to-top"]/europe-core-root/europe-core-app-main/
-                    aem-page/aem-model-provider/aem-responsivegrid/div/aem-responsivegrid/
-                    div[4]/europe-core-product-list-tab-group-container/div/div/div/
-                    europe-core-product-list-tab-item-container/div/europe-core-overview-table-container/
-                    europe-core-product-table/table/"""
+        table_css = (
+            "europe-core-overview-table-container europe-core-product-table > table"
+        )
 
-        tbody_element_equity = self._get_located_element(f"{table_xpath}/tbody[2]")
+        tbody_element_equity = self._get_located_element(
+            f"{table_css} > tbody:nth-of-type(2)", locator="css"
+        )
 
-        tbody_element_bond = self._get_located_element(f"{table_xpath}/tbody[4]")
+        tbody_element_bond = self._get_located_element(
+            f"{table_css} > tbody:nth-of-type(4)", locator="css"
+        )
 
         tbody_element_multi_asset = self._get_located_element(
-            f"{table_xpath}/tbody[6]"
+            f"{table_css} > tbody:nth-of-type(6)", locator="css"
         )
 
         def _cycle_trough_tbody(tbody_element: WebElement, asset_class: str) -> dict:
             results = {}
-            trows = tbody_element.find_elements(By.TAG_NAME, "tr")
+            # Extract all the rows in a single round-trip to the browser
+            trows = self.driver.execute_script(EXTRACT_ROWS_SCRIPT, tbody_element)
 
             for row in trows:
-                # Product name and page
-                th = row.find_element(By.XPATH, ".//th")
-                a_element = th.find_element(By.TAG_NAME, "a")
-                name = ("Vanguard " + th.text).replace("\n", " ")
-                product_page = a_element.get_attribute("href")
-
-                # Currency
-                currency = row.find_element(By.XPATH, ".//td[1]").text
-                # TER
-                ter = row.find_element(By.XPATH, ".//td[2]").text
-                # Price
-                price = row.find_element(By.XPATH, ".//td[3]").text
-                # Date
-                date = row.find_element(By.XPATH, ".//td[4]").text
-                # ISIN number
-                isin = row.find_element(By.XPATH, ".//td[5]").text
-                # Ticker
-                ticker = row.find_element(
-                    By.XPATH, ".//td[6]"
-                ).text  # TODO: bloomberg exchange mapping: https://www.inforeachinc.com/bloomberg-exchange-code-mapping
-                # Factsheet
-                factsheet = row.find_element(By.XPATH, ".//td[7]/span/a").get_attribute(
-                    "href"
-                )
-                # KID
-                kid = row.find_element(By.XPATH, ".//td[8]/span/a").get_attribute(
-                    "href"
-                )
-
-                results[isin] = {
-                    "name": name,
-                    "ticker": ticker,
+                # TODO: bloomberg exchange mapping: https://www.inforeachinc.com/bloomberg-exchange-code-mapping
+                results[row["isin"]] = {
+                    "name": ("Vanguard " + row["name"]).replace("\n", " "),
+                    "ticker": row["ticker"],
                     "asset_class": asset_class,
-                    "currency": currency,
-                    "ter": ter,
-                    "price": price,
-                    "date": date,
-                    "factsheet": factsheet,
-                    "kid": kid,
-                    "product_page": product_page,
+                    "currency": row["currency"],
+                    "ter": row["ter"],
+                    "price": row["price"],
+                    "date": row["date"],
+                    "factsheet": row["factsheet"],
+                    "kid": row["kid"],
+                    "product_page": row["product_page"],
                 }
 
             return results
 
-        products_dict = {}
         equity = _cycle_trough_tbody(tbody_element_equity, "equity")
         bond = _cycle_trough_tbody(tbody_element_bond, "bond")
         multi_asset = _cycle_trough_tbody(tbody_element_multi_asset, "multi_asset")
@@ -118,47 +118,37 @@ class VanguardScraper(BaseScraper):
         """
         Download the holdings file from the single product page
         """
-        self.logger.info(f"Downloading the holdings file from {product_page}")
+        self.logger.info("Downloading the holdings file from %s", product_page)
 
         self.open_web_page(product_page)
-        sleep(1)
-
-        # Download the holdings file, xpath changes based on product type
-        button_xpath = """//*[@id="back-to-top"]/europe-core-root/europe-core-product-page/
-                        aem-page/aem-model-provider/aem-responsivegrid/div/
-                        aem-responsivegrid/div[3]/europe-core-jump-links-list/"""
-        match asset_class:
-            case "equity":
-                button_xpath += """div[17]/europe-core-fund-holdings-container/
-                                europe-core-fund-holdings/div/div/div[1]/div[2]/
-                                europe-core-download-button/button"""
-            case "bond":
-                button_xpath += """div[18]/europe-core-fund-holdings-container/
-                                europe-core-fund-holdings/div/div/div[1]/div[2]/
-                                europe-core-download-button/button"""
-            case "multi_asset":
-                button_xpath += """div[11]/europe-core-basket-details-container/
-                                europe-core-basket-details/div/div/div/div[2]/
-                                europe-core-download-button/button"""
-            case _:
-                self.logger.error(f"Unknown product type: {asset_class}")
-                raise ValueError(f"Unknown product type div: {asset_class}")
-
-        download_button = self._get_located_element(button_xpath)
 
+        # Download the holdings file, selector changes based on product type
+        button_css = HOLDINGS_BUTTON_SELECTORS.get(asset_class)
+        if button_css is None:
+            self.logger.error("Unknown product type: %s", asset_class)
+            raise ValueError(f"Unknown product type div: {asset_class}")
+
+        download_button = self._get_located_element(button_css, locator="css")
+
+        files_before = self._clear_browser_downloads()
         download_button.click()
-        sleep(3)  # Wait for the download to finish and not overload the server
+        downloaded_file = self._wait_for_download(files_before)
 
         # Rename the file as the ISIN number
-        self._rename_latest_downloaded_file(new_file_name=f"{isin_number}")
+        if downloaded_file:
+            self._rename_downloaded_file(
+                downloaded_file, new_file_name=f"{isin_number}"
+            )
 
     def download_product_files(self, products_dict: dict) -> None:
-        # Cycle trough each product by ISIN
-        for isin in products_dict.keys():
-            product_page = products_dict[isin]["product_page"]
-            self._download_single_product_holdings(
-                products_dict[isin]["asset_class"], isin, product_page
-            )
+        # Cycle trough each product by ISIN, spread over the worker browsers
+        isins = list(products_dict.keys())
+        self._map_on_workers(
+            self._download_single_product_holdings,
+            [products_dict[isin]["asset_class"] for isin in isins],
+            isins,
+            [products_dict[isin]["product_page"] for isin in isins],
+        )
 
 
 def main():